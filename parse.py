@@ -1,59 +1,164 @@
 #!/usr/bin/env python3
-import json, csv, re
-from bs4 import BeautifulSoup
+import argparse, codecs, functools, glob, json, csv, re, weakref
+from concurrent.futures import ProcessPoolExecutor
+from itertools import takewhile
+from operator import itemgetter
+try: import orjson
+except ImportError: orjson = None
+import lxml.html
+from lxml import etree
+from lxml.cssselect import CSSSelector, LxmlTranslator
 
 INPUT = "listing.html"
 OUT_JSON = "parsed.json"
 OUT_CSV  = "parsed.csv"
+COLS = ["business_name","business_category","date","reviewer_name","reviewer_location","review","star_rating","overall_rating"]
 
-def txt(el): 
-    return el.get_text(" ", strip=True) if el else None
+# compiled once at import; these run per review
+_ARIA_RE   = re.compile(r"(\d+(?:\.\d+)?)")
+_DATE_RE   = re.compile(r"(\b\w+\s+\d{1,2},\s*\d{4}\b|\b\d{1,2}\s\w+\s\d{4}\b|\b\d{4}-\d{2}-\d{2}\b)")
+_JUNK_RE   = re.compile(r"things to do|best of", re.I)
 
-def load_soup(p):
+SELECTORS = {
+    "biz_categories":    "div[data-testid='biz-meta-info'] a[href*='cflt=']",
+    "jsonld":            'script[type="application/ld+json"]',
+    "business_name":     "h1.y-css-1iiiexg, h1",
+    "overall_star":      '[role="img"][aria-label*="star"], [aria-label*="of 5 bubbles"]',
+    "reviewer_anchor":   '.user-passport-info a[href*="/user_details"]',
+    "review_container":  'section[aria-label="Recommended Reviews"] article, div[class*="review-container"], li[class*="review"], article[class*="review"]',
+    "reviewer_name":     'a[href*="/user_details"]',
+    "reviewer_location": '[data-testid="UserPassportInfoTextContainer"] span, div[data-testid="UserPassportInfoTextContainer"]',
+    "review_date":       '[data-test-target*="review-date"], .y-css-scqtta span.y-css-1vi7y4e, time, span[class*="ratingDate"]',
+    "review_star":       '[role="img"][aria-label*="star"], [aria-label*="star"], span[class*="ui_bubble_rating"]',
+    "review_text":       'p.comment__09f24__D0cxf span.raw__09f24__T4Ezm, q span, p, span[class*="raw__"]',
+}
+CATEGORY_FALLBACKS = ["a[href*='/search?cflt=']", "a[class*='category']", "a[data-analytics*='category']"]
+
+# CSS is translated to XPath once here; each call is a compiled lxml XPath
+_SEL = {k: CSSSelector(v) for k, v in SELECTORS.items()}
+_CAT_FALLBACKS = [CSSSelector(v) for v in CATEGORY_FALLBACKS]
+# single-element lookups only need the first hit; "(...)[1]" lets libxml2 stop
+# early on each union branch instead of collecting every match
+_PAGE_FIRST  = ("business_name", "overall_star")
+# per-review lookups run against a block and, like bs4's block.select_one(),
+# must not match the block element itself: descendant::, not descendant-or-self::
+_BLOCK_FIRST = ("reviewer_name", "reviewer_location", "review_date", "review_star", "review_text")
+_FIRST = {k: etree.XPath("(%s)[1]" % _SEL[k].path) for k in _PAGE_FIRST}
+_FIRST.update({k: etree.XPath("(%s)[1]" % LxmlTranslator().css_to_xpath(SELECTORS[k], prefix="descendant::"))
+               for k in _BLOCK_FIRST})
+# text bs4's get_text(" ", strip=True) would return: skips comments,
+# script/style bodies and anything inside <template>
+_TEXT_XP = etree.XPath("descendant::text()[not(parent::script or parent::style or ancestor::template)]")
+_CHARSET_RE = re.compile(rb'<meta[^>]*?charset\s*=\s*["\']?\s*([\w.:-]+)', re.I)
+# UTF-32 before UTF-16: the UTF-32-LE BOM starts with the UTF-16-LE one
+_BOMS = ((codecs.BOM_UTF32_LE, "UTF-32LE"), (codecs.BOM_UTF32_BE, "UTF-32BE"), (codecs.BOM_UTF8, "UTF-8"),
+         (codecs.BOM_UTF16_LE, "UTF-16LE"), (codecs.BOM_UTF16_BE, "UTF-16BE"))
+_HTML_LOOKUP = lxml.html.HtmlElementClassLookup()
+
+def first(sel, el):
+    hits = sel(el)
+    return hits[0] if hits else None
+
+def uniq(xs):
+    # order-preserving dedupe
+    seen = set()
+    return [x for x in xs if not (x in seen or seen.add(x))]
+
+def txt(el):
+    if el is None: return None
+    return " ".join(t for t in (s.strip() for s in _TEXT_XP(el)) if t)
+
+def _ld_texts(parser):
+    return [el.text for _, el in parser.read_events() if el.get("type") == "application/ld+json"]
+
+def page_encoding(h):
+    # a BOM wins; otherwise a <meta charset> within the same prescan window
+    # bs4 used (first max(2048, 5%) bytes). Pages declaring neither are
+    # treated as UTF-8 rather than left to libxml2's latin-1 guess
+    for bom, enc in _BOMS:
+        if h.startswith(bom): return enc
+    m = _CHARSET_RE.search(h, 0, max(2048, len(h) // 20))
+    return m.group(1).decode("ascii") if m else "utf-8"
+
+def _pull_parser(h):
+    enc = page_encoding(h)
+    # <script> end events hand us the JSON-LD while the tree is built,
+    # so it needs no second walk
+    try: parser = etree.HTMLPullParser(events=("end",), tag="script", encoding=enc)
+    except LookupError: parser = etree.HTMLPullParser(events=("end",), tag="script", encoding="utf-8")
+    parser.set_element_class_lookup(_HTML_LOOKUP)   # HtmlElement, which the JSON-LD weak cache needs
+    return parser
+
+def load_tree(p):
     with open(p, "rb") as f: h = f.read()
-    try: return BeautifulSoup(h, "lxml")
-    except Exception: return BeautifulSoup(h, "html.parser")
+    ld, tree = [], None
+    if h:
+        parser = _pull_parser(h)
+        parser.feed(h)
+        tree = parser.close(); ld = _ld_texts(parser)
+    # empty or blank page: an empty document, so every field comes out N/A
+    if tree is None: tree = lxml.html.Element("html")
+    _JSONLD_CACHE[tree] = decode_jsonld(ld)
+    return tree
 
+@functools.lru_cache(maxsize=64)   # a page repeats the same few labels
 def parse_rating_from_aria_label(s):
     if not s: return None
-    m = re.search(r"(\d+(?:\.\d+)?)", s)   # keep exact float (e.g., 4.3 / 4.5)
+    m = _ARIA_RE.search(s)   # keep exact float (e.g., 4.3 / 4.5)
     return float(m.group(1)) if m else None
 
-# -------- categories (uses your selector first, then fallbacks) --------
+# -------- JSON-LD (decoded once per tree, shared by all callers) --------
 import json as _json
-def extract_categories(soup):
+_JSONLD_CACHE = weakref.WeakKeyDictionary()
+
+def decode_jsonld(texts):
+    # one list of objects per <script> block; undecodable blocks are dropped
+    blocks = []
+    for t in texts:
+        try: data = _json.loads(t or "{}")
+        except Exception: continue
+        blocks.append(data if isinstance(data, list) else [data])
+    return blocks
+
+def parse_jsonld(tree):
+    # trees from load_tree are pre-filled; anything else is walked once here
+    blocks = _JSONLD_CACHE.get(tree)
+    if blocks is None:
+        blocks = _JSONLD_CACHE[tree] = decode_jsonld(sc.text for sc in _SEL["jsonld"](tree))
+    return blocks
+
+# -------- categories (uses your selector first, then fallbacks) --------
+def extract_categories(tree):
     # 1) your selector
-    hits = soup.select("div[data-testid='biz-meta-info'] a[href*='cflt=']")
+    hits = _SEL["biz_categories"](tree)
     if hits:
-        cats = [txt(h) for h in hits if txt(h)]
-        if cats: return ", ".join(dict.fromkeys(cats))
-    # 2) JSON-LD
-    for sc in soup.select('script[type="application/ld+json"]'):
-        try: data = _json.loads(sc.string or sc.get_text() or "{}")
-        except Exception: continue
-        items = data if isinstance(data, list) else [data]
+        cats = [t for h in hits if (t := txt(h))]
+        if cats: return ", ".join(uniq(cats))
+    # 2) JSON-LD (first block that yields categories wins)
+    for items in parse_jsonld(tree):
         cats = []
         for obj in items:
+            if not isinstance(obj, dict): continue
             at = obj.get("@type"); at = " ".join(at) if isinstance(at, list) else at
             if at and any(k in at for k in ["LocalBusiness","Restaurant","Hotel","Organization","TouristAttraction","Product"]):
                 for k in ("servesCuisine","category"):
                     v = obj.get(k)
                     if isinstance(v, list): cats += [str(x) for x in v if x]
                     elif v: cats.append(str(v))
-        if cats: return ", ".join(dict.fromkeys(cats))
+        if cats: return ", ".join(uniq(cats))
     # 3) generic fallbacks
-    for sel in ["a[href*='/search?cflt=']","a[class*='category']","a[data-analytics*='category']"]:
-        hits = soup.select(sel)
-        cats = [txt(h) for h in hits if txt(h)]
-        if cats: return ", ".join(dict.fromkeys(cats))
+    for sel in _CAT_FALLBACKS:
+        hits = sel(tree)
+        cats = [t for h in hits if (t := txt(h))]
+        if cats: return ", ".join(uniq(cats))
     return None
 
 # -------- business info --------
-def extract_business(soup):
-    name = txt(soup.select_one("h1.y-css-1iiiexg, h1"))
-    category = extract_categories(soup) or "N/A"
-    star = soup.select_one('[role="img"][aria-label*="star"], [aria-label*="of 5 bubbles"]')
-    overall = parse_rating_from_aria_label(star["aria-label"]) if (star and star.has_attr("aria-label")) else None
+def extract_business(tree):
+    name = txt(first(_FIRST["business_name"], tree))
+    category = extract_categories(tree) or "N/A"
+    star = first(_FIRST["overall_star"], tree)
+    overall = parse_rating_from_aria_label(star.get("aria-label")) if star is not None else None
     return {
         "business_name": name or "N/A",
         "business_category": category,
@@ -61,50 +166,54 @@ def extract_business(soup):
     }
 
 # -------- reviews --------
-def extract_reviews(soup):
+def extract_reviews(tree):
     out = []
     # Anchor on actual profile links
-    candidates = soup.select('.user-passport-info a[href*="/user_details"]')
+    candidates = _SEL["reviewer_anchor"](tree)
     if not candidates:
-        containers = soup.select('section[aria-label="Recommended Reviews"] article, div[class*="review-container"], li[class*="review"], article[class*="review"]')
+        containers = _SEL["review_container"](tree)
         for c in containers: out.extend(parse_block(c))
         return postprocess(out)
     for a in candidates:
-        block = a.find_parent("li") or a.find_parent("article") or a.find_parent("div")
-        if block: out.extend(parse_block(block, forced_name=txt(a)))
+        block = next(a.iterancestors("li"), None)
+        if block is None: block = next(a.iterancestors("article"), None)
+        if block is None: block = next(a.iterancestors("div"), None)
+        if block is not None: out.extend(parse_block(block, forced_name=txt(a)))
     return postprocess(out)
 
 def parse_block(block, forced_name=None):
     rows = []
-    reviewer_name = forced_name or txt(block.select_one('a[href*="/user_details"]'))
+    reviewer_name = forced_name or txt(first(_FIRST["reviewer_name"], block))
 
     # ✅ reviewer location (from your screenshot)
-    loc_el = block.select_one('[data-testid="UserPassportInfoTextContainer"] span, div[data-testid="UserPassportInfoTextContainer"]')
+    loc_el = first(_FIRST["reviewer_location"], block)
     reviewer_location = txt(loc_el) or "N/A"
 
     # date
-    d = block.select_one('[data-test-target*="review-date"], .y-css-scqtta span.y-css-1vi7y4e, time, span[class*="ratingDate"]')
+    d = first(_FIRST["review_date"], block)
     date = txt(d)
     if date:
-        m = re.search(r"(\b\w+\s+\d{1,2},\s*\d{4}\b|\b\d{1,2}\s\w+\s\d{4}\b|\b\d{4}-\d{2}-\d{2}\b)", date)
+        m = _DATE_RE.search(date)
         if m: date = m.group(1)
 
     # per-review rating
-    star_el = block.select_one('[role="img"][aria-label*="star"], [aria-label*="star"], span[class*="ui_bubble_rating"]')
+    star_el = first(_FIRST["review_star"], block)
     star_rating = None
-    if star_el and star_el.has_attr("aria-label"):
-        star_rating = parse_rating_from_aria_label(star_el["aria-label"])
+    if star_el is not None and star_el.get("aria-label") is not None:
+        star_rating = parse_rating_from_aria_label(star_el.get("aria-label"))
     else:
-        cls = " ".join(star_el.get("class", [])) if star_el else ""
-        m = re.search(r"bubble_(\d+)", cls)
-        if m: star_rating = int(m.group(1)) / 10.0
+        cls = star_el.get("class", "") if star_el is not None else ""
+        for c in cls.split():
+            # digit run right after "bubble_" (bubble_45, bubble_45_x -> 4.5)
+            n = "".join(takewhile(str.isdecimal, c[7:])) if c.startswith("bubble_") else ""
+            if n: star_rating = int(n) / 10.0; break
 
     # text
-    text_el = block.select_one('p.comment__09f24__D0cxf span.raw__09f24__T4Ezm, q span, p, span[class*="raw__"]')
+    text_el = first(_FIRST["review_text"], block)
     review_text = txt(text_el)
 
     # skip junk/short rows
-    if review_text and len(review_text) >= 20 and not any(k in review_text.lower() for k in ["things to do","best of"]):
+    if review_text and len(review_text) >= 20 and not _JUNK_RE.search(review_text):
         rows.append({
             "date": date or "N/A",
             "reviewer_name": reviewer_name or "N/A",
@@ -115,41 +224,52 @@ def parse_block(block, forced_name=None):
     return rows
 
 def postprocess(rows):
-    # De-dup by (text, date)
-    seen, out = set(), []
-    for r in rows:
-        key = (r.get("review",""), r.get("date",""))
-        if key in seen: continue
-        seen.add(key); out.append(r)
-    return out
+    # De-dup by (text, date); parse_block always sets both keys, already stripped by txt()
+    seen = set()
+    return [r for r in rows if (k := (r["review"], r["date"])) not in seen and not seen.add(k)]
 
-def main():
-    soup = load_soup(INPUT)
-    biz = extract_business(soup)
-    reviews = extract_reviews(soup)
+def process_one(path):
+    tree = load_tree(path)
+    biz = extract_business(tree)
+    reviews = extract_reviews(tree)
 
+    # business fields are fixed per page: fill a COLS-ordered template once,
+    # then copy it and overwrite the review fields in place for each row
+    template = dict.fromkeys(COLS)
+    template.update(biz)
     rows = []
     for r in reviews:
-        rows.append({
-            "business_name": biz["business_name"],
-            "business_category": biz["business_category"],
-            "date": r["date"],
-            "reviewer_name": r["reviewer_name"],
-            "reviewer_location": r["reviewer_location"],
-            "review": r["review"],
-            "star_rating": r["star_rating"],
-            "overall_rating": biz["overall_rating"],
-        })
+        row = template.copy(); row.update(r)
+        rows.append(row)
+    return rows
+
+def main():
+    ap = argparse.ArgumentParser(description="Parse saved listing pages into reviews JSON/CSV.")
+    ap.add_argument("--in", dest="inp", metavar="GLOB", default=INPUT, help="HTML file or glob (default: %(default)s)")
+    ap.add_argument("--jobs", type=int, metavar="N", default=1, help="worker processes for multi-file runs")
+    args = ap.parse_args()
+    paths = sorted(glob.glob(args.inp)) or [args.inp]
+
+    # pages are independent; fan out across processes, keep input order
+    rows = []
+    if args.jobs > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as ex:
+            for page_rows in ex.map(process_one, paths, chunksize=8): rows.extend(page_rows)
+    else:
+        for p in paths: rows.extend(process_one(p))
 
     # write JSON
-    with open(OUT_JSON, "w", encoding="utf-8") as f:
-        json.dump(rows, f, ensure_ascii=False, indent=2)
+    if orjson:
+        with open(OUT_JSON, "wb") as f:
+            f.write(orjson.dumps(rows, option=orjson.OPT_INDENT_2))
+    else:
+        with open(OUT_JSON, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
 
     # write CSV
-    cols = ["business_name","business_category","date","reviewer_name","reviewer_location","review","star_rating","overall_rating"]
     with open(OUT_CSV, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=cols); w.writeheader()
-        for r in rows: w.writerow({k: r.get(k, "N/A") for k in cols})
+        w = csv.writer(f); w.writerow(COLS)
+        w.writerows(map(itemgetter(*COLS), rows))
 
     print(f"Wrote {OUT_CSV} and {OUT_JSON} with {len(rows)} reviews.")
 